@@ -0,0 +1,93 @@
+import hashlib
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['FileCache']
+
+
+class FileCache:
+    """
+    Small on-disk JSON cache, one file per key under `cache_dir`.
+    Entries older than `ttl` seconds are treated as missing; hits are also
+    memoized in-process so repeat lookups never touch the disk. Writes are
+    buffered until flush(), keeping disk I/O off the caller's hot path.
+    Entries written under a different `version` (e.g. after the logic that
+    produced the values changed) are treated as missing too.
+    """
+
+    def __init__(self, cache_dir, ttl, version=None):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.version = version
+        self._memo = {}
+        self._dirty = set()  # keys set() since the last flush()
+
+    def _path(self, key):
+        """File holding `key`; hashed so any symbol is a safe file name."""
+        digest = hashlib.md5(key.encode('utf-8'), usedforsecurity=False).hexdigest()
+        return os.path.join(self.cache_dir, digest + '.json')
+
+    def get(self, key):
+        """Return the cached value for `key`, or None if absent or expired."""
+        entry = self._memo.get(key)
+        if entry is None:
+            try:
+                with open(self._path(key), 'r') as f:
+                    entry = json.load(f)
+            except FileNotFoundError:
+                return None
+            except (OSError, ValueError) as e:
+                logger.warning("[CACHE] Unreadable entry for %s: %s", key, e)
+                return None
+        try:
+            stale = (time.time() - entry['ts'] > self.ttl
+                     or entry.get('version') != self.version)
+            value = entry['value']
+        except (TypeError, KeyError, AttributeError):
+            # Valid JSON of the wrong shape (hand-edited, or an older format)
+            logger.warning("[CACHE] Malformed entry for %s, ignoring it", key)
+            return None
+        if stale:
+            # Expired or produced by other rules - drop it so .cache/ doesn't grow forever
+            self._memo.pop(key, None)
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            return None
+        self._memo[key] = entry
+        return value
+
+    def set(self, key, value):
+        """Store `value` under `key` in memory; it reaches disk on the next flush()."""
+        self._memo[key] = {'value': value, 'ts': time.time(), 'version': self.version}
+        self._dirty.add(key)
+
+    def flush(self):
+        """Write entries set() since the last flush; failures are logged, never raised."""
+        if not self._dirty:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        except OSError as e:
+            logger.warning("[CACHE] Could not create %s: %s", self.cache_dir, e)
+            return
+        for key in self._dirty:
+            entry = self._memo.get(key)
+            if entry is None:
+                continue  # expired again before it was written
+            path = self._path(key)
+            # Replace rather than overwrite so a reader never sees a half-written file;
+            # no fsync - a lost entry is just recomputed
+            tmp_path = path + '.tmp'
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump(entry, f)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning("[CACHE] Could not write entry for %s: %s", key, e)
+        self._dirty.clear()
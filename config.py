@@ -1,5 +1,10 @@
+import datetime as _dt
+from typing import NamedTuple
+from zoneinfo import ZoneInfo
+
 # Global Trading Configuration
 ORDER_QUANTITY = 300 # refers to $ amount per trade
+MAX_CLOSE_ATTEMPTS = 5  # bounded retries when the exit order can't be placed
 TIMEZONE = 'US/Eastern'  
 
 # ENTRY: Friday pre-market
@@ -15,13 +20,44 @@ EXIT_TIME_HOUR = 4
 EXIT_TIME_MINUTE = 1
 EXIT_TIME_SECOND = 0
 
+# Precomputed once so the scheduler doesn't rebuild them every tick
+TZ = ZoneInfo(TIMEZONE)
+ENTRY_TIME = _dt.time(ENTRY_TIME_HOUR, ENTRY_TIME_MINUTE, ENTRY_TIME_SECOND)
+EXIT_TIME = _dt.time(EXIT_TIME_HOUR, EXIT_TIME_MINUTE, EXIT_TIME_SECOND)
+
 # IB Gateway Connection
 IB_HOST = '127.0.0.1'
 IB_PORT = 4002
 IB_CLIENT_ID = 1
-RECONNECT_INTERVAL = 5  # seconds
+RECONNECT_INTERVAL = 1  # seconds, base delay for exponential backoff
+RECONNECT_MAX_INTERVAL = 30  # seconds, cap on the backoff window
+CONNECT_DEADLINE_SEC = 60  # wall-clock budget for one connect, whatever MAX_RETRIES says
 MAX_RETRIES = 10
+HEALTHCHECK_TTL = 5  # seconds a successful health check is trusted
+HEALTHCHECK_INTERVAL = 5  # seconds between background health checks while connected
+HEALTHCHECK_MAX_INTERVAL = 60  # seconds, cap on the backoff after failed checks
+
+# On-disk cache
+CACHE_DIR = '.cache'
+DERIVATIVE_CACHE_TTL = 30 * 24 * 3600  # seconds; ticker suffix semantics rarely change
 
 # Logging
 LOG_LEVEL = 'INFO'
 LOG_FILE = 'trading_strategy.log'
+
+
+class ConnectionConfig(NamedTuple):
+    """Frozen snapshot of the IB Gateway connection settings."""
+    host: str
+    port: int
+    client_id: int
+    max_retries: int
+    reconnect_interval: float
+    reconnect_max_interval: float
+    connect_deadline_sec: float
+
+
+CONNECTION_CONFIG = ConnectionConfig(
+    IB_HOST, IB_PORT, IB_CLIENT_ID, MAX_RETRIES,
+    RECONNECT_INTERVAL, RECONNECT_MAX_INTERVAL, CONNECT_DEADLINE_SEC,
+)
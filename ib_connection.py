@@ -1,57 +1,272 @@
 import logging
-from ib_insync import IB, util
+import random
+import time
+from ib_insync import IB
 import config
 import asyncio
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+__all__ = ['IBConnectionManager', 'get_shared_manager']
+
+# IB error codes, see https://interactivebrokers.github.io/tws-api/message_codes.html
+_CONN_LOST_CODES = frozenset({1100, 1300, 2110})
+_CONN_RESTORED_CODES = frozenset({1101, 1102, 2104})
+_CRITICAL_CODES = frozenset({502, 504, 10053})
+
 class IBConnectionManager:
     """
     Asyncio-based IB Connection Manager.
     Handles connection, reconnection, and provides IB instance.
     """
     
+    # '__weakref__' is required: eventkit holds bound-method handlers weakly
+    __slots__ = (
+        'ib', 'connected', '_last_healthcheck_ts', '_healthcheck_ttl',
+        '_reconnect_lock', '_reconnect_task', '_disconnecting',
+        '_inflight_healthcheck', '_last_msg_ts', '_heartbeat_stale_sec',
+        '_reconnect_generation', 'needs_reconnect', '_session_wanted',
+        '_connectivity_lost',
+        '__weakref__',
+    )
+    
     def __init__(self):
         self.ib = IB()
         self.connected = False
+        self._last_healthcheck_ts = 0.0
+        self._healthcheck_ttl = config.HEALTHCHECK_TTL
+        self._reconnect_lock = asyncio.Lock()
+        self._reconnect_task = None
+        self._reconnect_generation = 0
+        self.needs_reconnect = asyncio.Event()
+        self._session_wanted = False  # between connect_async() and disconnect_async()
+        self._disconnecting = False
+        self._inflight_healthcheck = None
+        self._last_msg_ts = 0.0
+        self._heartbeat_stale_sec = 30  # seconds of silence before probing
+        self._connectivity_lost = False  # Gateway reported lost upstream link, not yet restored
+        self._register_handlers()
         
+    def _register_handlers(self):
+        """Attach event handlers to the IB instance; safe to call repeatedly."""
+        # Detach-then-attach only our own slots; clearing would also drop
+        # internal waiters such as ib.waitOnUpdate() on updateEvent
+        self.ib.errorEvent -= self._on_error
+        self.ib.errorEvent += self._on_error
+        self.ib.disconnectedEvent -= self._on_disconnected
+        self.ib.disconnectedEvent += self._on_disconnected
+        self.ib.updateEvent -= self._on_update
+        self.ib.updateEvent += self._on_update
+    
+    def _is_socket_alive(self):
+        """Check the API socket only, without probing or reconnecting."""
+        return self.ib.isConnected()
+    
     async def connect_async(self):
-        """Establish async connection to IB Gateway."""
-        max_retries = config.MAX_RETRIES
+        """Establish async connection to IB Gateway and keep it up until disconnect_async()."""
+        self._session_wanted = True
+        if not await self._connect():
+            # Callers skip disconnect_async() when connecting fails, so don't leave
+            # the watcher retrying in the background until the next signal
+            self._session_wanted = False
+            return False
+        # Wake the watcher so it starts its periodic health checks for this session
+        self.needs_reconnect.set()
+        return True
+    
+    async def _connect(self):
+        """
+        Connect without touching _session_wanted; shared by connect_async and
+        the reconnect paths, so a background reconnect can't claim a session.
+        """
+        # Fast path: session is up and was verified recently, skip the retry machinery
+        if self.ib.isConnected() and time.monotonic() - self._last_healthcheck_ts < self._healthcheck_ttl:
+            self.connected = True
+            return True
+        
+        if self._reconnect_lock.locked():
+            # Another coroutine is already connecting - share its outcome
+            logger.info("[IB] Connection attempt already in progress, waiting for it...")
+            async with self._reconnect_lock:
+                return self._is_socket_alive()
+        
+        async with self._reconnect_lock:
+            return await self._connect_with_retries()
+    
+    async def _connect_with_retries(self):
+        """Retry loop behind _connect; caller must hold the reconnect lock."""
+        # Any reconnect requested before this point is now stale
+        self._reconnect_generation += 1
+        (host, port, client_id, max_retries, interval,
+         max_interval, deadline_sec) = config.CONNECTION_CONFIG
         retry_count = 0
+        deadline = time.monotonic() + deadline_sec
+        
+        # Reuse the same IB instance across reconnects; just make sure
+        # handlers are attached once rather than stacking duplicates
+        self._register_handlers()
         
         while retry_count < max_retries:
             try:
-                logger.info(f"[IB] Attempting to connect to IB Gateway at {config.IB_HOST}:{config.IB_PORT}...")
+                logger.info("[IB] Attempting to connect to IB Gateway at %s:%d...", host, port)
                 await self.ib.connectAsync(
-                    host=config.IB_HOST,
-                    port=config.IB_PORT,
-                    clientId=config.IB_CLIENT_ID
+                    host=host,
+                    port=port,
+                    clientId=client_id
                 )
                 self.connected = True
+                self._last_healthcheck_ts = time.monotonic()
+                self._connectivity_lost = False
                 logger.info("[IB] ✓ Successfully connected to IB Gateway")
                 return True
                 
             except Exception as e:
                 retry_count += 1
-                logger.error(f"[IB] Connection failed (attempt {retry_count}/{max_retries}): {e}")
+                logger.error("[IB] Connection failed (attempt %d/%d): %s", retry_count, max_retries, e)
                 
-                if retry_count < max_retries:
-                    logger.info(f"[IB] Retrying in {config.RECONNECT_INTERVAL} seconds...")
-                    await asyncio.sleep(config.RECONNECT_INTERVAL)
-                else:
+                if retry_count >= max_retries:
                     logger.error("[IB] Max retries reached. Connection failed.")
-                    self.connected = False
-                    return False
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.error("[IB] Gave up after %ss. Connection failed.", deadline_sec)
+                    break
+                
+                # Full-jitter exponential backoff so clients don't retry in lockstep,
+                # clamped so the final attempt lands on the deadline rather than past it
+                delay = random.uniform(0, min(max_interval, interval * 2 ** (retry_count - 1)))
+                delay = min(delay, max(0.1, remaining))
+                logger.info("[IB] Retrying in %.1f seconds...", delay)
+                await asyncio.sleep(delay)
+        
+        self.connected = False
+        return False
+    
+    async def _test_connection(self):
+        """
+        Verify the API session responds.
+        Recent traffic from the Gateway counts as proof of life; only a silent
+        session is actively probed, and concurrent callers share that one probe.
+        """
+        # The packet carrying a connectivity-lost code is traffic too, so the
+        # passive shortcut is off until the Gateway reports the link restored
+        if (not self._connectivity_lost and self.ib.isConnected()
+                and time.monotonic() - self._last_msg_ts < self._heartbeat_stale_sec):
+            return True
+        if self._inflight_healthcheck is None or self._inflight_healthcheck.done():
+            self._inflight_healthcheck = asyncio.ensure_future(self._probe_server_time())
+        # Shield so a cancelled caller doesn't cancel the probe for everyone else
+        return await asyncio.shield(self._inflight_healthcheck)
+    
+    async def _probe_server_time(self):
+        """Round-trip a server time request to the Gateway."""
+        try:
+            server_time = await asyncio.wait_for(self.ib.reqCurrentTimeAsync(), timeout=2.0)
+            logger.debug("[TEST] Server time: %s", server_time)
+            self._last_healthcheck_ts = time.monotonic()
+            return True
+        except asyncio.TimeoutError:
+            logger.warning("[IB] Health check timed out waiting for server time")
+            return False
+        except Exception as e:
+            logger.warning("[IB] Health check failed: %s", e)
+            return False
     
     async def ensure_connected_async(self):
         """Check connection and reconnect if needed."""
         if not self.ib.isConnected():
             logger.warning("[IB] Connection lost. Attempting to reconnect...")
             self.connected = False
-            return await self.connect_async()
-        return True
+            return await self._connect()
+        
+        # Skip the round-trip if the session was verified recently
+        if time.monotonic() - self._last_healthcheck_ts < self._healthcheck_ttl:
+            return True
+        
+        if await self._test_connection():
+            return True
+        
+        logger.warning("[IB] Connection unresponsive. Attempting to reconnect...")
+        self.connected = False
+        self.ib.disconnect()
+        return await self._connect()
+    
+    def _on_error(self, reqId, errorCode, errorString, contract):
+        """Track connectivity-related error codes reported by IB."""
+        if errorCode in _CONN_LOST_CODES:
+            logger.warning("[IB] Connectivity lost (code %d): %s", errorCode, errorString)
+            self._last_healthcheck_ts = 0.0
+            self._last_msg_ts = 0.0
+            self._connectivity_lost = True
+            if self.connected:
+                # Don't reconnect from inside the callback - wake the watcher instead
+                self._request_reconnect(self._reconnect_generation)
+        elif errorCode in _CRITICAL_CODES:
+            # Socket-level failures; the connect loop or disconnect handler owns recovery
+            self._last_healthcheck_ts = 0.0
+        elif errorCode in _CONN_RESTORED_CODES:
+            logger.info("[IB] Connectivity restored (code %d): %s", errorCode, errorString)
+            self._connectivity_lost = False
+    
+    def _on_update(self):
+        """Heartbeat watchdog: note when the Gateway last sent us anything."""
+        self._last_msg_ts = time.monotonic()
+    
+    def _on_disconnected(self):
+        """Mark the session down and schedule recovery if the drop was unexpected."""
+        was_connected = self.connected
+        self.connected = False
+        self._last_healthcheck_ts = 0.0
+        if was_connected and not self._disconnecting:
+            asyncio.ensure_future(self._handle_unexpected_disconnect(self._reconnect_generation))
+    
+    async def _handle_unexpected_disconnect(self, generation):
+        """Give the Gateway a moment, then reconnect without blocking the event loop."""
+        logger.warning("[IB] Disconnected unexpectedly. Reconnecting shortly...")
+        await asyncio.sleep(2)
+        self._request_reconnect(generation)
+    
+    def _request_reconnect(self, generation):
+        """
+        Flag the session for the reconnect watcher.
+        Requests from a connection generation that has since been replaced are dropped.
+        """
+        if generation != self._reconnect_generation:
+            return
+        self.needs_reconnect.set()
+    
+    async def wait_for_reconnect(self):
+        """
+        Background watcher: reconnect whenever a callback flags the session as lost,
+        and health-check it periodically while a session is wanted.
+        Meant to run as a task for the strategy's lifetime; bursts of requests coalesce.
+        Failed checks back off exponentially so a dead Gateway isn't hammered.
+        """
+        interval = config.HEALTHCHECK_INTERVAL
+        while True:
+            # No timer while offline: between signals only an event can wake the watcher
+            timeout = interval if self._session_wanted else None
+            try:
+                await asyncio.wait_for(self.needs_reconnect.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self.needs_reconnect.clear()
+            if not self._session_wanted:
+                # Torn down on purpose - neither a late request nor the timer may revive it
+                interval = config.HEALTHCHECK_INTERVAL
+                continue
+            task = asyncio.ensure_future(self.ensure_connected_async())
+            self._reconnect_task = task
+            # asyncio.wait() doesn't raise if disconnect_async() cancels the attempt
+            await asyncio.wait({task})
+            self._reconnect_task = None
+            
+            if not task.cancelled() and task.exception() is None and task.result():
+                interval = config.HEALTHCHECK_INTERVAL
+            else:
+                interval = min(interval * 2, config.HEALTHCHECK_MAX_INTERVAL)
+                if self._session_wanted:
+                    logger.warning("[IB] Health check failed, next attempt in %ss", interval)
     
     def get_ib(self):
         """Get the IB instance."""
@@ -63,8 +278,39 @@ class IBConnectionManager:
     
     async def disconnect_async(self):
         """Disconnect from IB Gateway."""
-        if self.ib.isConnected():
+        self._session_wanted = False
+        # Stop any pending background reconnect so teardown can't revive the session;
+        # bumping the generation also drops requests still sleeping in a disconnect handler
+        self._reconnect_generation += 1
+        self.needs_reconnect.clear()
+        if self._reconnect_task is not None and not self._reconnect_task.done():
+            self._reconnect_task.cancel()
+        self._reconnect_task = None
+        
+        was_connected = self.ib.isConnected()
+        if was_connected:
             logger.info("[IB] Disconnecting from IB Gateway...")
+        self._disconnecting = True
+        try:
+            # Always reset the client, even if the socket already looks closed
             self.ib.disconnect()
-            self.connected = False
+        finally:
+            self._disconnecting = False
+        self.connected = False
+        if was_connected:
             logger.info("[IB] Disconnected successfully")
+
+
+_shared_manager = None
+
+
+def get_shared_manager():
+    """
+    Process-wide IBConnectionManager, created on first use.
+    Every strategy in the process should go through this so they share one
+    Gateway session (and one client id) instead of each opening their own.
+    """
+    global _shared_manager
+    if _shared_manager is None:
+        _shared_manager = IBConnectionManager()
+    return _shared_manager
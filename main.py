@@ -1,10 +1,23 @@
+import asyncio
 import logging
+import logging.config
+import signal
 from post_market_strategy import PostMarketGainerStrategy
 import config
-import asyncio
 from ib_insync import util
 
-logging.basicConfig(level=logging.INFO)
+logging.config.dictConfig({
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'default': {'format': '%(asctime)s %(levelname)s:%(name)s:%(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'default'},
+        'file': {'class': 'logging.FileHandler', 'filename': config.LOG_FILE, 'formatter': 'default'},
+    },
+    'root': {'level': config.LOG_LEVEL, 'handlers': ['console', 'file']},
+})
 logger = logging.getLogger(__name__)
 
 async def main():
@@ -14,8 +27,28 @@ async def main():
     # Initialize strategy
     strategy = PostMarketGainerStrategy(order_quantity=config.ORDER_QUANTITY)
     
+    # Ctrl+C / service stop wakes the scheduler so it returns cleanly between signals;
+    # a second one while an entry/exit is still running aborts it
+    main_task = asyncio.current_task()
+    
+    def on_signal():
+        if strategy.running:
+            strategy.stop()
+        else:
+            main_task.cancel()
+    
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, on_signal)
+        except NotImplementedError:
+            pass  # not supported by Windows event loops; Ctrl+C still raises KeyboardInterrupt
+    
     # Start the strategy (runs asynchronously)
-    await strategy.start_async()
+    try:
+        await strategy.start_async()
+    except asyncio.CancelledError:
+        logger.warning("[MAIN] Aborted by a repeated stop signal")
 
 if __name__ == "__main__":
     # Use ib_insync's util.run for proper event loop management with IB
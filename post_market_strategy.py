@@ -1,19 +1,49 @@
+import hashlib
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 import asyncio
-import pytz
+import random
+import time
 import json
+import math
 import os
+import re
 from ib_insync import Stock, Order, util
-from ib_connection import IBConnectionManager
+from ib_connection import get_shared_manager
+from cache import FileCache
 import config
 from ib_insync import ScannerSubscription
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global IB instance - will be set when connecting
-ib = None
+# Warrants (W, WT, WS), SPAC units (U, .U) and rights (R, .RT)
+_DERIV_SUFFIXES = ('W', 'WT', 'WS', 'U', '.U', 'R', '.RT')
+# Warrant classes ('.WS', '.WT') and preferred series after the last '-', e.g. ABC-PR
+_DERIV_RE = re.compile(r'\.W[ST]|-(?:A|B|C|D|E|PR)$')
+# Fingerprint of the rules above; cached classifications made under other rules are ignored
+_DERIV_RULES_VERSION = hashlib.md5(
+    repr((_DERIV_SUFFIXES, _DERIV_RE.pattern)).encode('utf-8'), usedforsecurity=False
+).hexdigest()
+
+_BANNER = '=' * 60
+
+_WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+# A signal found more than this many seconds overdue is skipped rather than fired late
+_MISFIRE_GRACE_SEC = 60
+
+# Rows requested from the scanner; the filter only ever looks at the top few
+_SCANNER_ROWS = 10
+# Top non-derivative scanner rows quoted together when picking the entry
+_QUOTE_CANDIDATES = 5
+# IB completes a snapshot request within ~11 seconds; the rest is network slack
+_SNAPSHOT_TIMEOUT = 15
+
+
+def _valid(price):
+    """True for a usable quote field: present, not NaN and positive."""
+    return price is not None and not math.isnan(price) and price > 0
+
 
 class PostMarketGainerStrategy:
     """
@@ -21,16 +51,22 @@ class PostMarketGainerStrategy:
     Connects to IB only when entry/exit signals trigger, then disconnects.
     """
     
+    # IB market scanner used to pick the entry; override in a subclass to trade another scan
+    SCAN_CODE = 'TOP_AFTER_HOURS_PERC_GAIN'
+    
     def __init__(self, order_quantity=config.ORDER_QUANTITY):
-        self.ib_manager = IBConnectionManager()
+        self.ib_manager = get_shared_manager()
+        self._ib = None  # set only while connected for an entry/exit signal
         self.order_quantity = order_quantity
         self.active_position = None
         self.paper_mode = False
-        self.est_tz = pytz.timezone(config.TIMEZONE)
-        self.entry_triggered = False
-        self.exit_triggered = False
+        self.est_tz = config.TZ
         self.running = False
+        self._stop_event = asyncio.Event()
         self.state_file = 'strategy_state.json'
+        self._last_saved_state = None  # serialized form of the last successful write
+        self._derivative_cache = FileCache(
+            config.CACHE_DIR, config.DERIVATIVE_CACHE_TTL, version=_DERIV_RULES_VERSION)
         
         # Load previous state if exists
         self._load_state()
@@ -44,15 +80,26 @@ class PostMarketGainerStrategy:
                 state['active_position'] = {
                     'symbol': self.active_position['symbol'],
                     'quantity': self.active_position['quantity'],
-                    'entry_time': self.active_position['entry_time'].isoformat(),
-                    'entry_price': self.active_position.get('entry_price')
+                    'entry_time': self.active_position['entry_time'].timestamp(),
+                    'entry_price': self.active_position.get('entry_price'),
+                    'con_id': getattr(self.active_position.get('contract'), 'conId', None) or None
                 }
             else:
                 state['active_position'] = None
             
-            with open(self.state_file, 'w') as f:
-                json.dump(state, f, indent=2)
-            logger.debug(f"[STATE] Saved state to {self.state_file}")
+            serialized = json.dumps(state, indent=2)
+            if serialized == self._last_saved_state:
+                return
+            
+            # Write to a temp file and swap it in, so a crash mid-write can't corrupt the state
+            tmp_file = self.state_file + '.tmp'
+            with open(tmp_file, 'w') as f:
+                f.write(serialized)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.state_file)
+            self._last_saved_state = serialized
+            logger.debug("[STATE] Saved state to %s", self.state_file)
         except Exception as e:
             logger.error(f"[STATE] Error saving state: {e}")
     
@@ -65,16 +112,23 @@ class PostMarketGainerStrategy:
                 
                 if state.get('active_position'):
                     pos = state['active_position']
-                    # Restore position (will recreate contract when needed)
+                    # A saved conId identifies the contract exactly, so no re-qualification is needed
+                    contract = None
+                    if pos.get('con_id'):
+                        contract = Stock(pos['symbol'], 'SMART', 'USD', conId=pos['con_id'])
+                    entry_time = pos['entry_time']
+                    if isinstance(entry_time, str):
+                        # Older state files stored an ISO string
+                        entry_time = datetime.fromisoformat(entry_time).timestamp()
                     self.active_position = {
                         'symbol': pos['symbol'],
                         'quantity': pos['quantity'],
-                        'entry_time': datetime.fromisoformat(pos['entry_time']),
+                        'entry_time': datetime.fromtimestamp(entry_time, tz=self.est_tz),
                         'entry_price': pos.get('entry_price'),
-                        'contract': None,  # Will be recreated when needed
+                        'contract': contract,  # Recreated from the symbol if None
                         'order': None  # Will be recreated when needed
                     }
-                    logger.info(f"[STATE] Restored active position: {pos['symbol']} ({pos['quantity']} shares) from {pos['entry_time']}")
+                    logger.info(f"[STATE] Restored active position: {pos['symbol']} ({pos['quantity']} shares) from {self.active_position['entry_time']}")
                 else:
                     logger.info("[STATE] No active position found in saved state")
             else:
@@ -85,120 +139,163 @@ class PostMarketGainerStrategy:
         
     def get_current_est_time(self):
         """Get current time in EST timezone."""
-        utc_now = datetime.now(pytz.utc)
-        est_now = utc_now.astimezone(self.est_tz)
-        return est_now
+        return datetime.now(self.est_tz)
     
     def is_derivative_security(self, symbol):
         """
         Check if symbol is a warrant, unit, right, or other derivative.
         Returns True if it should be FILTERED OUT.
         """
-        symbol_upper = symbol.upper().strip()
-
-        # Warrant patterns (ends with W, WT, WS)
-        if symbol_upper.endswith('W'):
-            return True
-        if symbol_upper.endswith('WT'):
-            return True
-        if symbol_upper.endswith('WS'):
-            return True
-        if '.WS' in symbol_upper or '.WT' in symbol_upper:
-            return True
-
-        # SPAC Unit patterns (ends with U)
-        if symbol_upper.endswith('U'):
-            return True
-        if symbol_upper.endswith('.U'):
-            return True
-
-        # Rights patterns
-        if symbol_upper.endswith('R'):
-            return True
-        if symbol_upper.endswith('.RT'):
-            return True
-
-        # Preferred stock patterns
-        if '-' in symbol_upper:
-            parts = symbol_upper.split('-')
-            if len(parts) > 1 and parts[-1] in ['A', 'B', 'C', 'D', 'E', 'PR']:
-                return True
-
-        return False
-
-
-    def get_first_valid_top_gainer(self, scanner_results):
-       
+        symbol_upper = symbol.upper()
+        cached = self._derivative_cache.get(symbol_upper)
+        if cached is not None:
+            return cached
+
+        # Warrant, SPAC unit and rights suffixes in a single endswith() pass;
+        # '.WS'/'.WT' anywhere and preferred series ('-A'..'-E', '-PR') in one regex scan
+        is_derivative = symbol_upper.endswith(_DERIV_SUFFIXES) or _DERIV_RE.search(symbol_upper) is not None
+        self._derivative_cache.set(symbol_upper, is_derivative)
+        return is_derivative
+
+    def get_valid_top_gainers(self, scanner_results, limit=_QUOTE_CANDIDATES):
+        """Return up to `limit` scanner results that are not derivatives, in rank order."""
         if not scanner_results or len(scanner_results) == 0:
             logger.warning("[FILTER] No scanner results to filter")
-            return None
+            return []
 
         logger.info(f"[FILTER] Filtering {len(scanner_results)} results for non-derivatives...")
 
-        for i, result in enumerate(scanner_results):
-            rank = i + 1
-            symbol = result.contractDetails.contract.symbol
+        # Pull every symbol out once instead of walking contractDetails.contract per check
+        symbols = [r.contractDetails.contract.symbol.strip() for r in scanner_results]
+        valid, skipped = [], []
+        for i, sym in enumerate(symbols):
+            if len(valid) == limit:
+                break
+            if self.is_derivative_security(sym):
+                skipped.append(sym)
+            else:
+                valid.append(i)
 
-            logger.info(f"[FILTER] Rank #{rank}: Checking {symbol}...")
+        if skipped:
+            logger.warning(f"[FILTER] Skipped {len(skipped)} derivative(s): {', '.join(skipped)}")
 
-            # Skip if derivative
-            if self.is_derivative_security(symbol):
-                logger.warning(f"[FILTER] Rank #{rank}: {symbol} is derivative - SKIPPING")
-                continue
-            
-            # Found valid stock - return immediately
-            logger.info(f"[FILTER] ✓ FOUND: {symbol} at rank #{rank} (non-derivative)")
-            return result
+        if not valid:
+            # All results were derivatives
+            logger.error(f"[FILTER] All {len(scanner_results)} results were derivatives")
+            return []
 
-        # All results were derivatives
-        logger.error(f"[FILTER] All {len(scanner_results)} results were derivatives")
-        return None
+        logger.info(f"[FILTER] ✓ FOUND: {', '.join(f'{symbols[i]} (#{i + 1})' for i in valid)} (non-derivative)")
+        return [scanner_results[i] for i in valid]
 
+    async def _fetch_quote(self, contract, timeout=5):
+        """
+        Request a market data snapshot and wait until both bid and ask have arrived.
+        Returns (bid, ask, last); bid/ask stay NaN if nothing arrived within `timeout`.
+        """
+        # One-shot snapshot: TWS ends it by itself, so there is no stream to cancel
+        ticker = self._ib.reqMktData(contract, '', snapshot=True, regulatorySnapshot=False)
+        # ib_insync hands back the same Ticker for a contract it has quoted before;
+        # blank the old fields so a retry waits for this request's data, not the last one's
+        ticker.bid = ticker.ask = ticker.last = math.nan
+        try:
+            await asyncio.wait_for(self._wait_for_quote(ticker), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"[QUOTE] No quote for {contract.symbol} within {timeout}s")
+        return ticker.bid, ticker.ask, ticker.last
+    
+    @staticmethod
+    async def _wait_for_quote(ticker):
+        """Wake on each ticker update until bid and ask are both populated."""
+        while math.isnan(ticker.bid) or math.isnan(ticker.ask):
+            await ticker.updateEvent
+    
+    @staticmethod
+    async def _wait_for_scan(results):
+        """Wake on each scanner update until the first batch of rows has arrived."""
+        while not results:
+            await results.updateEvent
+    
+    @staticmethod
+    async def _wait_for_fill(trade, timeout):
+        """
+        Return as soon as the order fills or reaches another final state
+        (cancelled, or rejected as Inactive), or after `timeout` seconds at most.
+        """
+        async def settled():
+            while not trade.isDone() and trade.orderStatus.status != 'Inactive':
+                await trade.statusEvent
+        try:
+            await asyncio.wait_for(settled(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+    
     async def get_post_market_top_gainer(self):
-        """Fetch the price of the #1 post-market top gainer (async)."""
-        global ib
+        """
+        Pick the top post-market gainer and price its entry (async).
+        Returns (contract, limit_price), or (None, None) if nothing is tradable.
+        """
         try:
 
-            logger.info("[SCANNER] Requesting TOP_AFTER_HOURS_PERC_GAIN scanner subscription...")
-            #TOP_AFTER_HOURS_PERC_GAIN
+            logger.info(f"[SCANNER] Requesting {self.SCAN_CODE} scanner subscription...")
             scanner = ScannerSubscription(
                 instrument='STK',
                 locationCode='STK.US.MAJOR',
-                scanCode='TOP_AFTER_HOURS_PERC_GAIN',  
+                scanCode=self.SCAN_CODE,
+                numberOfRows=_SCANNER_ROWS,
             )
 
-            results = ib.reqScannerSubscription(scanner)
-            await asyncio.sleep(8)  # Async sleep to wait for results
+            results = self._ib.reqScannerSubscription(scanner)
+            # Rows usually land well under a second; 8s is only the ceiling
+            try:
+                await asyncio.wait_for(self._wait_for_scan(results), timeout=8)
+            except asyncio.TimeoutError:
+                pass
+            # Only the first batch is used; stop TWS from pushing further updates
+            self._ib.cancelScannerSubscription(results)
 
             logger.info(f"[SCANNER] Received {len(results)} results")
 
             if results and len(results) > 0:
 
-                top_gainer = self.get_first_valid_top_gainer(results)
-
-                symbol = top_gainer.contractDetails.contract.symbol
-
-                price = getattr(top_gainer, 'price', None)
-                if price is None:
-                    contract = top_gainer.contractDetails.contract
-                    ticker = ib.reqMktData(contract, '', False, False)
-                    await asyncio.sleep(2)  # Async sleep for data to arrive
+                candidates = self.get_valid_top_gainers(results)
+                if not candidates:
+                    return None, None
+
+                # ScanData carries no price, so snapshot-quote every candidate in one batch
+                # and take the highest-ranked one that actually has a two-sided market
+                contracts = [r.contractDetails.contract for r in candidates]
+                try:
+                    tickers = await asyncio.wait_for(self._ib.reqTickersAsync(*contracts), timeout=_SNAPSHOT_TIMEOUT)
+                except asyncio.TimeoutError:
+                    # Some snapshots may still have landed - use whatever the tickers hold
+                    logger.warning(f"[SCANNER] Snapshot batch incomplete after {_SNAPSHOT_TIMEOUT}s - using partial quotes")
+                    tickers = [t for t in map(self._ib.ticker, contracts) if t is not None]
+
+                ticker = next((t for t in tickers if _valid(t.bid) and _valid(t.ask)), None)
+                if ticker is not None:
+                    bid_price, ask_price, last_price = ticker.bid, ticker.ask, ticker.last
+                else:
+                    # No two-sided market anywhere - price off the last trade, with no spread padding
+                    ticker = next((t for t in tickers if _valid(t.last)), None)
+                    if ticker is None:
+                        logger.error(f"[SCANNER] No usable quote for {', '.join(c.symbol for c in contracts)} - cannot price entry")
+                        return None, None
+                    logger.warning(f"[SCANNER] No valid bid/ask for {ticker.contract.symbol} - using last price {ticker.last}")
+                    bid_price = ask_price = last_price = ticker.last
 
-                    ask_price = ticker.ask
-                    bid_price = ticker.bid
-                    last_price = ticker.last
+                symbol = ticker.contract.symbol
 
-                    print(f"[SCANNER] Fetched market data for {symbol}: bid={bid_price}, ask={ask_price}, last={last_price}")
-                    
-                    # Calculate based on spread
-                    limit_price = round(ask_price + ((abs(ask_price - bid_price)) * 2), 2)
-                    ib.cancelMktData(contract)
+                print(f"[SCANNER] Fetched market data for {symbol}: bid={bid_price}, ask={ask_price}, last={last_price}")
+                
+                # Calculate based on spread
+                limit_price = round(ask_price + ((abs(ask_price - bid_price)) * 2), 2)
 
-                    price = limit_price
+                price = limit_price
 
 
                 logger.info(f"Top pre-market gainer: {symbol} Price: {price}")
-                return symbol, price
+                # The scanner's contract already carries the conId
+                return ticker.contract, price
             else:
                 logger.warning("[SCANNER] No results returned from scanner")
                 return None, None
@@ -208,34 +305,45 @@ class PostMarketGainerStrategy:
             return None, None
 
     
-    async def execute_long_trade(self, symbol, quantity, price=None):
-        """Execute a long (buy) order (async)."""
-        global ib
+    @staticmethod
+    def _build_limit_order(action, quantity, price):
+        """Build the GTC limit order used for both entry and exit, allowed outside RTH."""
+        order = Order()
+        order.action = action
+        order.totalQuantity = quantity
+        order.orderType = 'LMT'
+        order.outsideRth = True
+        order.lmtPrice = price
+        order.tif = 'GTC'  # Good Till Cancelled
+        return order
+    
+    async def execute_long_trade(self, contract, quantity, price=None):
+        """Execute a long (buy) order (async) for a scanner contract."""
         try:
+            symbol = contract.symbol
+            # Route through SMART like before; a known conId needs no qualification round trip
+            contract = Stock(symbol, 'SMART', 'USD', conId=contract.conId)
             
-            contract = Stock(symbol, 'SMART', 'USD')
-            
-            order = Order()
-            order.action = 'BUY'
-            order.totalQuantity = quantity
-            order.orderType = 'LMT'
-            order.outsideRth = True
-            order.lmtPrice = price
-            order.tif = 'GTC'  # Good Till Cancelled
+            order = self._build_limit_order('BUY', quantity, price)
             
             if self.paper_mode:
                 logger.info("[ENTRY] Paper mode enabled - skipping trade execution")
                 print("[paper] entry - would buy", quantity, "shares of", symbol, "at limit price", price)
                 return None
             
+            if not contract.conId:
+                # Resolve the conId once; it is reused for the exit and persisted in state
+                await self._ib.qualifyContractsAsync(contract)
+            
             logger.info(f"[TRADE] Placing BUY order for {quantity} shares of {symbol} at limit price {price}...")
-            trade = ib.placeOrder(contract, order)
+            trade = self._ib.placeOrder(contract, order)
             
             est_time = self.get_current_est_time()
+            entry_mono = time.monotonic()
             logger.info(f"✓ ENTRY: BUY {quantity} shares of {symbol} at {est_time} EST")
             logger.info(f"[TRADE] Order status[1]: {trade.orderStatus.status}")
 
-            await asyncio.sleep(20)  # Async sleep
+            await self._wait_for_fill(trade, timeout=20)
             
     
             logger.info(f"[TRADE] Order status: {trade.orderStatus.status}")
@@ -244,6 +352,7 @@ class PostMarketGainerStrategy:
                 'symbol': symbol,
                 'quantity': quantity,
                 'entry_time': est_time,
+                'entry_mono': entry_mono,  # in-process only, not persisted
                 'entry_price': price,
                 'order': trade,
                 'contract': contract
@@ -254,91 +363,107 @@ class PostMarketGainerStrategy:
             
             return trade
             
-        except Exception as e:
-            logger.error(f"[TRADE] Error executing long trade: {type(e).__name__}: {e}")
-            import traceback
-            logger.error(f"[TRADE] Traceback: {traceback.format_exc()}")
+        except Exception:
+            logger.exception("[TRADE] Error executing long trade")
             return None
     
     async def close_position(self):
-        """Exit the trade - sell all shares (async)."""
-        global ib
-        try:
-            if not self.active_position:
-                logger.warning("[TRADE] No active position to close")
-                return None
-            
-            symbol = self.active_position['symbol']
-            quantity = self.active_position['quantity']
-            
-            # Recreate contract if it doesn't exist (e.g., after restart)
-            contract = self.active_position.get('contract')
-            if contract is None:
-                logger.info(f"[TRADE] Recreating contract for {symbol}")
-                contract = Stock(symbol, 'SMART', 'USD')
-                self.active_position['contract'] = contract
-            
-            ticker = ib.reqMktData(contract, '', False, False)
-            await asyncio.sleep(2)  # Async sleep for data to arrive
-            ask_price = ticker.ask
-            bid_price = ticker.bid
-            last_price = ticker.last
-            limit_price = round(bid_price - ((abs(ask_price - bid_price)) * 2), 2)
-            print(f"[SCANNER] Fetched market data for {symbol}: bid={bid_price}, ask={ask_price}, last={last_price} , limit price for sell: {limit_price}")
-
-            ib.cancelMktData(contract)
-            if bid_price is None:
-                logger.error(f"[TRADE] Cannot close position for {symbol} - invalid bid price")
-                raise ValueError("Invalid bid price")
-            order = Order()
-            order.action = 'SELL'
-            order.totalQuantity = quantity
-            order.orderType = 'LMT'
-            order.outsideRth = True
-            order.lmtPrice = limit_price
-            order.tif = 'GTC'  # Good Till Cancelled
-
-            logger.info(f"[TRADE] Placing SELL order for {quantity} shares of {symbol} at limit price {limit_price}...")
-            if self.paper_mode:
-                logger.info("[EXIT] Paper mode enabled - skipping trade execution")
-                print("[paper]  exit - would sell", quantity, "shares of", symbol)
-                return None
-            trade = ib.placeOrder(contract, order)
-            
-            exit_time = self.get_current_est_time()
-            entry_time = self.active_position['entry_time']
-            hold_duration = exit_time - entry_time
-            await asyncio.sleep(10)  # Async sleep
-
-            logger.info(f"\n{'='*60}")
-            logger.info(f"✓ EXIT: SELL {quantity} shares of {symbol} at {exit_time} EST")
-            logger.info(f"Entry time:  {entry_time}")
-            logger.info(f"Exit time:   {exit_time}")
-            logger.info(f"Hold duration: {hold_duration}")
-            logger.info(f"[TRADE] Order status: {trade.orderStatus.status}")
-            logger.info(f"{'='*60}\n")
-            
-            self.active_position = None
-            
-            # Save state to file
-            self._save_state()
-            
-            return trade
+        """Exit the trade - sell all shares (async), retrying with backoff on failure."""
+        if not self.active_position:
+            logger.warning("[TRADE] No active position to close")
+            return None
+        
+        max_attempts = config.MAX_CLOSE_ATTEMPTS
+        for attempt in range(max_attempts):
+            try:
+                return await self._close_position_once()
+            except ValueError as e:
+                # Raised before any order is placed - just fetch a fresh quote next time
+                logger.warning(f"[TRADE] {e} - re-requesting market data (attempt {attempt + 1}/{max_attempts})")
+            except Exception as e:
+                logger.error(f"[exception found in close_position()] Error closing position: {type(e).__name__}: {e}")
             
-        except Exception as e:
-            logger.error(f"[exception found in close_position()] Error closing position: {type(e).__name__}: {e}")
-            logger.info("[close_position() exception handler] Retrying to close position...")
-            await self.close_position()
-                
+            if attempt + 1 < max_attempts:
+                # Full-jitter exponential backoff instead of retrying immediately
+                delay = random.uniform(0, min(30, 2 ** attempt))
+                logger.info(f"[close_position() exception handler] Retrying to close position in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+                # The failure may have been a dropped session - make sure the next attempt has one
+                if not await self.ib_manager.ensure_connected_async():
+                    logger.error("[TRADE] IB Gateway still unreachable before retrying close")
+                self._ib = self.ib_manager.get_ib()
+        
+        logger.error(f"[TRADE] Giving up on closing {self.active_position['symbol']} after {max_attempts} attempts")
+        return None
+    
+    async def _close_position_once(self):
+        """Single attempt at selling the active position; raises on failure."""
+        symbol = self.active_position['symbol']
+        quantity = self.active_position['quantity']
+        
+        # Recreate contract if it doesn't exist (e.g., after restart)
+        contract = self.active_position.get('contract')
+        if contract is None:
+            logger.info("[TRADE] Recreating contract for %s", symbol)
+            contract = Stock(symbol, 'SMART', 'USD')
+            self.active_position['contract'] = contract
+        
+        bid_price, ask_price, last_price = await self._fetch_quote(contract)
+        if not (_valid(bid_price) and _valid(ask_price)):
+            if not _valid(last_price):
+                logger.error("[TRADE] Cannot close position for %s - invalid bid/ask price", symbol)
+                raise ValueError("Invalid bid/ask price")
+            logger.warning("[TRADE] No valid bid/ask for %s - using last price %s", symbol, last_price)
+            bid_price = ask_price = last_price
+
+        limit_price = round(bid_price - ((abs(ask_price - bid_price)) * 2), 2)
+        if not _valid(limit_price):
+            # A spread wider than half the bid would put the limit at or below zero
+            raise ValueError(f"Invalid limit price {limit_price} from bid={bid_price}, ask={ask_price}")
+        print(f"[SCANNER] Fetched market data for {symbol}: bid={bid_price}, ask={ask_price}, last={last_price} , limit price for sell: {limit_price}")
+
+        order = self._build_limit_order('SELL', quantity, limit_price)
+
+        logger.info("[TRADE] Placing SELL order for %s shares of %s at limit price %s...", quantity, symbol, limit_price)
+        if self.paper_mode:
+            logger.info("[EXIT] Paper mode enabled - skipping trade execution")
+            print("[paper]  exit - would sell", quantity, "shares of", symbol)
+            return None
+        trade = self._ib.placeOrder(contract, order)
+        
+        exit_time = self.get_current_est_time()
+        entry_time = self.active_position['entry_time']
+        entry_mono = self.active_position.get('entry_mono')
+        if entry_mono is not None:
+            # Same process as the entry: monotonic clock is immune to wall-clock jumps
+            hold_duration = timedelta(seconds=time.monotonic() - entry_mono)
+        else:
+            # Restored after a restart; compare absolute timestamps so DST can't skew it
+            hold_duration = timedelta(seconds=exit_time.timestamp() - entry_time.timestamp())
+        await self._wait_for_fill(trade, timeout=10)
+
+        logger.info("\n%s", _BANNER)
+        logger.info("✓ EXIT: SELL %s shares of %s at %s EST", quantity, symbol, exit_time)
+        logger.info("Entry time:  %s", entry_time)
+        logger.info("Exit time:   %s", exit_time)
+        logger.info("Hold duration: %s", hold_duration)
+        logger.info("[TRADE] Order status: %s", trade.orderStatus.status)
+        logger.info("%s\n", _BANNER)
+        
+        self.active_position = None
+        
+        # Save state to file
+        self._save_state()
+        
+        return trade
     
     async def entry_logic(self):
         """Entry signal - connect, execute trade, then disconnect (async)."""
-        global ib
        
         est_time = self.get_current_est_time()
-        logger.info(f"\n{'='*60}")
-        logger.info(f"✓✓✓ ENTRY SIGNAL TRIGGERED at {est_time} EST ✓✓✓")
-        logger.info(f"{'='*60}")
+        logger.info("\n%s", _BANNER)
+        logger.info("✓✓✓ ENTRY SIGNAL TRIGGERED at %s EST ✓✓✓", est_time)
+        logger.info(_BANNER)
         
         # Connect to IB Gateway for this entry signal
         logger.info("[ENTRY] Connecting to IB Gateway...")
@@ -346,34 +471,44 @@ class PostMarketGainerStrategy:
             logger.error("[ENTRY] Failed to connect to IB Gateway")
             return
         
-        # Set global ib reference
-        ib = self.ib_manager.get_ib()
+        # IB instance for the duration of this signal
+        self._ib = self.ib_manager.get_ib()
         
         try:
             logger.info("[ENTRY] Fetching post-market top gainer...")
-            symbol, price = await self.get_post_market_top_gainer()
+            contract, price = await self.get_post_market_top_gainer()
             
-            if symbol:
-                logger.info(f"[ENTRY] Found gainer: {symbol} ({price:.2f})")
-                shares = int(self.order_quantity // price)
-                print("===shares calculated:", shares)
-                await self.execute_long_trade(symbol, shares, price=price)
-            else:
+            if contract is None:
                 logger.warning("[ENTRY] Skipping entry - no post-market top gainer found")
+                return
+            
+            symbol = contract.symbol
+            if price is None or not math.isfinite(price) or price <= 0:
+                logger.error("[ENTRY] Skipping entry - invalid price for %s: %s", symbol, price)
+                return
+            
+            logger.info("[ENTRY] Found gainer: %s (%.2f)", symbol, price)
+            shares = int(self.order_quantity // price)
+            print("===shares calculated:", shares)
+            if shares < 1:
+                logger.warning("[ENTRY] Skipping entry - $%s buys no shares of %s at %.2f", self.order_quantity, symbol, price)
+                return
+            await self.execute_long_trade(contract, shares, price=price)
         finally:
             # Disconnect after entry execution
             logger.info("[ENTRY] Disconnecting from IB Gateway...")
             await self.ib_manager.disconnect_async()
-            ib = None
+            self._ib = None
+            # Persist new derivative classifications now that the order is out of the way
+            self._derivative_cache.flush()
     
     async def exit_logic(self):
         """Exit signal - connect, close position, then disconnect (async)."""
-        global ib
         
         est_time = self.get_current_est_time()
-        logger.info(f"\n{'='*60}")
-        logger.info(f"✓✓✓ EXIT SIGNAL TRIGGERED at {est_time} EST ✓✓✓")
-        logger.info(f"{'='*60}")
+        logger.info("\n%s", _BANNER)
+        logger.info("✓✓✓ EXIT SIGNAL TRIGGERED at %s EST ✓✓✓", est_time)
+        logger.info(_BANNER)
         
         # Connect to IB Gateway for this exit signal
         logger.info("[EXIT] Connecting to IB Gateway...")
@@ -381,8 +516,8 @@ class PostMarketGainerStrategy:
             logger.error("[EXIT] Failed to connect to IB Gateway")
             return
         
-        # Set global ib reference
-        ib = self.ib_manager.get_ib()
+        # IB instance for the duration of this signal
+        self._ib = self.ib_manager.get_ib()
         
         try:
             await self.close_position()
@@ -390,77 +525,87 @@ class PostMarketGainerStrategy:
             # Disconnect after exit execution
             logger.info("[EXIT] Disconnecting from IB Gateway...")
             await self.ib_manager.disconnect_async()
-            ib = None
+            self._ib = None
     
-    async def check_and_trigger_async(self):
-        """
-        Async scheduler - checks time and executes trade logic.
-        """
-        est_now = self.get_current_est_time()
-        current_hour = est_now.hour
-        current_minute = est_now.minute
-        current_second = est_now.second
-        current_weekday = est_now.weekday()
-        
-        # Check ENTRY
-        if (current_weekday == config.ENTRY_DAY and 
-            current_hour == config.ENTRY_TIME_HOUR and 
-            current_minute == config.ENTRY_TIME_MINUTE and
-            current_second == config.ENTRY_TIME_SECOND and
-            not self.entry_triggered):
-            logger.info(f"[SCHEDULER] Entry time matched! {current_hour:02d}:{current_minute:02d}:{current_second:02d}")
-            self.entry_triggered = True
-            await self.entry_logic()  # Execute directly in async context
-            return
-        
-        if current_minute != config.ENTRY_TIME_MINUTE:
-            self.entry_triggered = False
-        
-        # Check EXIT
-        if (current_weekday == config.EXIT_DAY and 
-            current_hour == config.EXIT_TIME_HOUR and 
-            current_minute == config.EXIT_TIME_MINUTE and
-            current_second == config.EXIT_TIME_SECOND and
-            not self.exit_triggered):
-            logger.info(f"[SCHEDULER] Exit time matched! {current_hour:02d}:{current_minute:02d}:{current_second:02d}")
-            self.exit_triggered = True
-            await self.exit_logic()  # Execute directly in async context
-            return
-        
-        if current_minute != config.EXIT_TIME_MINUTE:
-            self.exit_triggered = False
+    def _next_occurrence(self, now, weekday, at):
+        """Next datetime strictly after `now` that falls on `weekday` at time `at` (EST)."""
+        days_ahead = (weekday - now.weekday()) % 7
+        candidate = datetime.combine(now.date() + timedelta(days=days_ahead), at, tzinfo=self.est_tz)
+        if candidate <= now:
+            candidate += timedelta(days=7)
+        return candidate
+    
+    def stop(self):
+        """Ask start_async() to return; wakes the scheduler now rather than at the next signal."""
+        self.running = False
+        self._stop_event.set()
     
     async def start_async(self):
         """Start the strategy - connects to IB only when signals trigger."""
-        logger.info("\n" + "="*60)
+        logger.info("\n%s", _BANNER)
         logger.info("Starting Post-Market Gainer Strategy (Asyncio - On-Demand Connection)")
-        logger.info("="*60)
-        logger.info(f"Timezone: {config.TIMEZONE} (EST/EDT)")
-        logger.info(f"Order quantity: ${config.ORDER_QUANTITY}")
-        logger.info(f"\nENTRY:  {['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'][config.ENTRY_DAY]}  {config.ENTRY_TIME_HOUR:02d}:{config.ENTRY_TIME_MINUTE:02d}:{config.ENTRY_TIME_SECOND:02d} EST")
-        logger.info(f"EXIT:   {['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'][config.EXIT_DAY]}  {config.EXIT_TIME_HOUR:02d}:{config.EXIT_TIME_MINUTE:02d}:{config.EXIT_TIME_SECOND:02d} EST")
-        logger.info("="*60 + "\n")
+        logger.info(_BANNER)
+        logger.info("Timezone: %s (EST/EDT)", config.TIMEZONE)
+        logger.info("Order quantity: $%s", config.ORDER_QUANTITY)
+        logger.info("\nENTRY:  %s  %s EST", _WEEKDAYS[config.ENTRY_DAY], config.ENTRY_TIME)
+        logger.info("EXIT:   %s  %s EST", _WEEKDAYS[config.EXIT_DAY], config.EXIT_TIME)
+        logger.info("%s\n", _BANNER)
         
         est_time = self.get_current_est_time()
-        logger.info(f"Current EST time: {est_time}")
+        logger.info("Current EST time: %s", est_time)
         logger.info("Strategy running. Will connect to IB only when entry/exit signals trigger...\n")
         
         self.running = True
+        self._stop_event.clear()
+        
+        # Reconnects are driven by IB callbacks, not by polling in this loop
+        reconnect_watcher = asyncio.ensure_future(self.ib_manager.wait_for_reconnect())
+        
+        # One absolute target per signal, computed once and advanced a week after it fires
+        now = self.get_current_est_time()
+        targets = {
+            'ENTRY': self._next_occurrence(now, config.ENTRY_DAY, config.ENTRY_TIME),
+            'EXIT': self._next_occurrence(now, config.EXIT_DAY, config.EXIT_TIME),
+        }
+        handlers = {'ENTRY': self.entry_logic, 'EXIT': self.exit_logic}
         
         try:
             while self.running:
-                # Check for scheduled times and execute logic
-                # Connection happens inside entry_logic() and exit_logic()
-                await self.check_and_trigger_async()
+                name = min(targets, key=targets.get)
+                fire_at = targets[name]
+                targets[name] = fire_at + timedelta(days=7)  # same wall time next week
+                logger.info("[SCHEDULER] Next signal: %s at %s EST", name, fire_at)
+                
+                # Sleep straight through to the target instead of polling the clock.
+                # Absolute timestamps keep the delay correct across DST changes.
+                delay = fire_at.timestamp() - time.time()
+                if delay > 0:
+                    # Block on the stop event with the delay as timeout, so stop() wakes us at once
+                    try:
+                        await asyncio.wait_for(self._stop_event.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                if not self.running:
+                    break
                 
-                await asyncio.sleep(0.5)  # Async sleep
+                lateness = time.time() - fire_at.timestamp()
+                if lateness > _MISFIRE_GRACE_SEC:
+                    # e.g. the host was suspended through the signal - don't trade late
+                    logger.warning("[SCHEDULER] Missed %s at %s by %.0fs - skipping", name, fire_at, lateness)
+                    continue
+                
+                logger.info("[SCHEDULER] %s time reached: %s", name, fire_at.time())
+                # Connection happens inside entry_logic() and exit_logic()
+                await handlers[name]()
                 
         except KeyboardInterrupt:
+            pass  # only where main.py couldn't install signal handlers (Windows)
+        except Exception as e:
+            logger.exception("[MAIN] Unexpected error: %s", e)
+        finally:
+            # Runs however we got here: stop(), KeyboardInterrupt or a cancelled task
             logger.info("\nStopping strategy...")
             if self.active_position:
                 logger.warning("WARNING: Closing strategy with active position!")
-        except Exception as e:
-            logger.error(f"[MAIN] Unexpected error: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+            reconnect_watcher.cancel()
 